@@ -17,5 +17,7 @@ class Settings(BaseModel):
 
     finnhub_api_key: str = os.getenv("FINNHUB_API_KEY", "")
 
+    maco_compute_engine: str = os.getenv("MACO_COMPUTE_ENGINE", "pandas")
+
 
 settings = Settings()
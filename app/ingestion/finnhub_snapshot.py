@@ -1,22 +1,29 @@
 
 from __future__ import annotations
 
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+import orjson
 import pandas as pd
+import pyarrow as pa
 import requests
 
 from app.config import settings
 from app.utils.gcs import build_partition_path, upload_bytes
-from app.utils.bq import get_bq_client, load_dataframe
+from app.utils.bq import get_bq_client, load_arrow_table
+from app.utils.http import SESSION
+from app.utils.log import log
+from app.utils.tables import PRICES_1D, PRICES_1D_ARROW_SCHEMA, PRICES_1D_SCHEMA, SYMBOL_CLUSTERING, TRADE_DATE_PARTITIONING
 from google.cloud import bigquery
 
 from app.ingestion.yahoo_backfill import fetch_yahoo_prices
 
 
 SYMBOL_MAP = {"AAPL": "AAPL", "TSLA": "TSLA", "BTC-USD": "COINBASE:BTC-USD"}
+MAX_WORKERS = 16
+PRICE_COLUMNS = ("open", "high", "low", "close", "adj_close")
 
 
 def prev_day_range() -> tuple[int, int, datetime]:
@@ -26,18 +33,22 @@ def prev_day_range() -> tuple[int, int, datetime]:
     return int(start.timestamp()), int((start + timedelta(days=1)).timestamp()), start
 
 
-def fetch_snapshot(symbol: str) -> Optional[dict]:
-    start, end, start_dt = prev_day_range()
+def fetch_snapshot(
+    symbol: str,
+    session: requests.Session = SESSION,
+    day_range: Optional[tuple[int, int, datetime]] = None,
+) -> Optional[dict]:
+    start, end, start_dt = day_range or prev_day_range()
     vendor = SYMBOL_MAP.get(symbol, symbol)
     is_crypto = symbol == "BTC-USD"
     url = "https://finnhub.io/api/v1/crypto/candle" if is_crypto else "https://finnhub.io/api/v1/stock/candle"
-    r = requests.get(
+    r = session.get(
         url,
         params={"symbol": vendor, "resolution": "D", "from": start, "to": end, "token": settings.finnhub_api_key},
         timeout=20,
     )
     r.raise_for_status()
-    data = r.json()
+    data = orjson.loads(r.content)
     if data.get("s") != "ok" or not data.get("t"):
         return None
     return {
@@ -58,38 +69,11 @@ def fetch_yahoo_fallback(symbol: str) -> Optional[dict]:
     if df.empty:
         return None
     row = df.sort_values("trade_date").iloc[-1]
-    return {
-        "trade_date": row["trade_date"],
-        "open": float(row["open"]) if row["open"] is not None else None,
-        "high": float(row["high"]) if row["high"] is not None else None,
-        "low": float(row["low"]) if row["low"] is not None else None,
-        "close": float(row["close"]) if row["close"] is not None else None,
-        "adj_close": float(row["adj_close"]) if row.get("adj_close") is not None else None,
-        "volume": int(row["volume"]) if row.get("volume") is not None else None,
-        "symbol": symbol,
-        "provider": "yahoo",
-    }
-
-
-def to_dataframe(record: dict) -> pd.DataFrame:
-    base = {
-        "trade_date": record.get("trade_date"),
-        "open": record.get("open"),
-        "high": record.get("high"),
-        "low": record.get("low"),
-        "close": record.get("close"),
-        "volume": record.get("volume"),
-        "symbol": record.get("symbol"),
-        "provider": record.get("provider"),
-    }
-    if "adj_close" in record:
-        base["adj_close"] = record.get("adj_close")
-    df = pd.DataFrame([base])
-    columns = ["trade_date", "open", "high", "low", "close", "adj_close", "volume", "symbol", "provider"]
-    for col in columns:
-        if col not in df.columns:
-            df[col] = pd.NA
-    return df[columns]
+    record = {"trade_date": row["trade_date"]}
+    record.update({col: None if pd.isna(row[col]) else float(row[col]) for col in PRICE_COLUMNS})
+    record["volume"] = None if pd.isna(row["volume"]) else int(row["volume"])
+    record.update(symbol=symbol, provider="yahoo")
+    return record
 
 
 def write_raw_json(symbol: str, payload: dict, provider: str) -> str:
@@ -98,72 +82,73 @@ def write_raw_json(symbol: str, payload: dict, provider: str) -> str:
     object_name = build_partition_path(base_prefix, symbol, trade_date, "candles.json")
     return upload_bytes(
         settings.gcs_bucket,
-        json.dumps(payload, default=str).encode("utf-8"),
+        orjson.dumps(payload, default=str),
         object_name,
         "application/json",
     )
 
 
-def load_to_prices_1d(df: pd.DataFrame) -> None:
+def load_to_prices_1d(records: list[dict]) -> None:
+    # A handful of rows per run: build the Arrow table straight from the records instead of via pandas.
     client = get_bq_client(settings.bq_location)
-    table = f"{settings.gcp_project_id}.{settings.dataset_prices_1d}.prices_1d"
-    schema = [
-        bigquery.SchemaField("trade_date", "DATE"),
-        bigquery.SchemaField("open", "FLOAT"),
-        bigquery.SchemaField("high", "FLOAT"),
-        bigquery.SchemaField("low", "FLOAT"),
-        bigquery.SchemaField("close", "FLOAT"),
-        bigquery.SchemaField("adj_close", "FLOAT"),
-        bigquery.SchemaField("volume", "INT64"),
-        bigquery.SchemaField("symbol", "STRING"),
-        bigquery.SchemaField("provider", "STRING"),
-        bigquery.SchemaField("ingest_ts", "TIMESTAMP"),
-    ]
-    df = df.copy()
-    if "adj_close" not in df.columns:
-        df["adj_close"] = pd.NA
-    df["ingest_ts"] = pd.Timestamp.utcnow()
-    load_dataframe(
+    ingest_ts = datetime.now(timezone.utc)
+    table = pa.Table.from_pylist(
+        [{**record, "ingest_ts": ingest_ts} for record in records],
+        schema=PRICES_1D_ARROW_SCHEMA,
+    )
+    load_arrow_table(
         client,
-        df,
         table,
+        PRICES_1D(),
         write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-        schema=schema,
-        time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="trade_date"),
-        clustering_fields=["symbol"],
+        schema=PRICES_1D_SCHEMA,
+        time_partitioning=TRADE_DATE_PARTITIONING,
+        clustering_fields=SYMBOL_CLUSTERING,
     )
 
 
+def fetch_record(symbol: str, day_range: Optional[tuple[int, int, datetime]] = None) -> Optional[dict]:
+    record: Optional[dict] = None
+    if settings.finnhub_api_key:
+        try:
+            record = fetch_snapshot(symbol, day_range=day_range)
+        except requests.HTTPError as http_err:
+            log(f"Finnhub HTTP error for {symbol}: {http_err}")
+        except Exception as exc:
+            log(f"Unexpected Finnhub error for {symbol}: {exc}")
+
+    if not record:
+        fallback = fetch_yahoo_fallback(symbol)
+        if fallback:
+            write_raw_json(symbol, fallback, provider="yahoo")
+            log(f"Used Yahoo fallback for {symbol}.")
+        else:
+            log(f"No data available for {symbol} from Finnhub or Yahoo fallback.")
+        return fallback
+
+    write_raw_json(symbol, record, provider="finnhub")
+    return record
+
+
 def run(symbols: Optional[list[str]] = None) -> None:
     target_symbols = symbols or settings.symbols
-    frames: list[pd.DataFrame] = []
-    for sym in target_symbols:
-        record: Optional[dict] = None
-        if settings.finnhub_api_key:
-            try:
-                record = fetch_snapshot(sym)
-            except requests.HTTPError as http_err:
-                print(f"Finnhub HTTP error for {sym}: {http_err}")
-            except Exception as exc:
-                print(f"Unexpected Finnhub error for {sym}: {exc}")
-        else:
-            print("FINNHUB_API_KEY not set; skipping Finnhub fetch and falling back to Yahoo.")
-
-        if not record:
-            fallback = fetch_yahoo_fallback(sym)
-            if fallback:
-                write_raw_json(sym, fallback, provider="yahoo")
-                frames.append(to_dataframe(fallback))
-                print(f"Used Yahoo fallback for {sym}.")
-            else:
-                print(f"No data available for {sym} from Finnhub or Yahoo fallback.")
-            continue
-
-        write_raw_json(sym, record, provider="finnhub")
-        frames.append(to_dataframe(record))
-
-    if frames:
-        load_to_prices_1d(pd.concat(frames, ignore_index=True))
+    if not target_symbols:
+        return
+    if not settings.finnhub_api_key:
+        log("FINNHUB_API_KEY not set; skipping Finnhub fetch and falling back to Yahoo.")
+
+    # Resolve "yesterday" once so every symbol targets the same day, even across midnight.
+    day_range = prev_day_range()
+    records: list[dict] = []
+    with ThreadPoolExecutor(max_workers=min(len(target_symbols), MAX_WORKERS)) as executor:
+        futures = [executor.submit(fetch_record, sym, day_range) for sym in target_symbols]
+        for future in as_completed(futures):
+            record = future.result()
+            if record:
+                records.append(record)
+
+    if records:
+        load_to_prices_1d(records)
 
 
 if __name__ == "__main__":
@@ -1,29 +1,69 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 
 from app.config import settings
-from app.transforms.maco import compute_maco_features, generate_signals
-from app.utils.bq import get_bq_client, run_query, load_dataframe
-from app.utils.tables import PRICES_1D, MACO_FEATURES, SIGNALS_MACO, PRED_NEXT_DAY
+from app.transforms.maco import compute_maco_features, generate_signals, maco_sql
+from app.utils.bq import get_bq_client, get_bqstorage_client, run_query, load_arrow_table
+from app.utils.tables import (
+    PRICES_1D,
+    MACO_FEATURES,
+    SIGNALS_MACO,
+    PRED_NEXT_DAY,
+    SYMBOL_CLUSTERING,
+    TRADE_DATE_PARTITIONING,
+)
+
+
+HISTORY_DAYS = 800
+# Calendar days re-read before the watermark so the 20-bar slow SMA and the previous bar
+# are fully warmed up again, even across weekends and market holidays.
+WARMUP_DAYS = 45
+SMA_FAST = 10
+SMA_SLOW = 20
+
+
+def fetch_watermarks(client: bigquery.Client) -> dict[str, Optional[date]]:
+    # Latest signals_maco trade_date for every symbol listed in prices_1d; None for symbols that have
+    # never been computed. main() writes signals last, so this only advances once all outputs landed.
+    sql = f"""
+    SELECT p.symbol, MAX(s.trade_date) AS watermark
+    FROM (SELECT DISTINCT symbol FROM `{PRICES_1D()}`) AS p
+    LEFT JOIN `{SIGNALS_MACO()}` AS s USING (symbol)
+    GROUP BY p.symbol
+    """
+    try:
+        rows = run_query(client, sql)
+    except NotFound:
+        return {}
+    return {row["symbol"]: row["watermark"] for row in rows}
 
 
-def fetch_prices(client: bigquery.Client) -> pd.DataFrame:
+def fetch_prices(client: bigquery.Client, since: date) -> pd.DataFrame:
     sql = f"""
-    SELECT trade_date, symbol, open, high, low, close
+    SELECT trade_date, symbol, close
     FROM `{PRICES_1D()}`
-    WHERE trade_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 800 DAY)
+    WHERE trade_date >= @since
     """
-    return client.query(sql).to_dataframe()
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("since", "DATE", since)]
+    )
+    # Storage Read API streams Arrow record batches instead of paging JSON rows over REST.
+    return client.query(sql, job_config=job_config).to_dataframe(bqstorage_client=get_bqstorage_client())
 
 
-def write_features(client: bigquery.Client, df: pd.DataFrame) -> None:
-    df_out = df[["trade_date", "symbol", "sma_fast", "sma_slow"]].copy()
-    df_out["ingest_ts"] = pd.Timestamp.utcnow()
-    load_dataframe(
+def write_features(client: bigquery.Client, table: pa.Table) -> None:
+    load_arrow_table(
         client,
-        df_out,
+        table.select(["trade_date", "symbol", "sma_fast", "sma_slow", "ingest_ts"]),
         MACO_FEATURES(),
         schema=[
             bigquery.SchemaField("trade_date", "DATE"),
@@ -32,17 +72,15 @@ def write_features(client: bigquery.Client, df: pd.DataFrame) -> None:
             bigquery.SchemaField("sma_slow", "FLOAT"),
             bigquery.SchemaField("ingest_ts", "TIMESTAMP"),
         ],
-        time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="trade_date"),
-        clustering_fields=["symbol"],
+        time_partitioning=TRADE_DATE_PARTITIONING,
+        clustering_fields=SYMBOL_CLUSTERING,
     )
 
 
-def write_signals(client: bigquery.Client, df: pd.DataFrame) -> None:
-    df_out = df[["trade_date", "symbol", "signal", "crossover"]].copy()
-    df_out["ingest_ts"] = pd.Timestamp.utcnow()
-    load_dataframe(
+def write_signals(client: bigquery.Client, table: pa.Table) -> None:
+    load_arrow_table(
         client,
-        df_out,
+        table.select(["trade_date", "symbol", "signal", "crossover", "ingest_ts"]),
         SIGNALS_MACO(),
         schema=[
             bigquery.SchemaField("trade_date", "DATE"),
@@ -51,32 +89,24 @@ def write_signals(client: bigquery.Client, df: pd.DataFrame) -> None:
             bigquery.SchemaField("crossover", "STRING"),
             bigquery.SchemaField("ingest_ts", "TIMESTAMP"),
         ],
-        time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="trade_date"),
-        clustering_fields=["symbol"],
+        time_partitioning=TRADE_DATE_PARTITIONING,
+        clustering_fields=SYMBOL_CLUSTERING,
     )
 
 
 def write_next_day_prediction(client: bigquery.Client, df: pd.DataFrame) -> None:
-    latest = df.sort_values(["symbol", "trade_date"]).groupby("symbol").tail(1).copy()
-    latest["predicted_signal"] = latest["signal"]
-    latest["predicted_direction"] = latest.apply(
-        lambda r: "UP" if r["sma_fast"] >= r["sma_slow"] else "DOWN", axis=1
+    # generate_signals returns rows ordered by (symbol, trade_date), so each symbol's last row is its latest.
+    latest = df.drop_duplicates("symbol", keep="last")
+    out = latest[["trade_date", "symbol"]].assign(
+        predicted_signal=latest["signal"],
+        predicted_direction=np.where(latest["sma_fast"].to_numpy() >= latest["sma_slow"].to_numpy(), "UP", "DOWN"),
+        predicted_close=latest["close"],
+        generated_at=pd.Series(pd.Timestamp.utcnow(), index=latest.index, dtype="datetime64[ns, UTC]"),
     )
-    latest["predicted_close"] = latest["close"]
-    latest["generated_at"] = pd.Timestamp.utcnow()
-
-    out = latest[[
-        "trade_date",
-        "symbol",
-        "predicted_signal",
-        "predicted_direction",
-        "predicted_close",
-        "generated_at",
-    ]]
-
-    load_dataframe(
+
+    load_arrow_table(
         client,
-        out,
+        pa.Table.from_pandas(out, preserve_index=False),
         PRED_NEXT_DAY(),
         schema=[
             bigquery.SchemaField("trade_date", "DATE"),
@@ -86,21 +116,91 @@ def write_next_day_prediction(client: bigquery.Client, df: pd.DataFrame) -> None
             bigquery.SchemaField("predicted_close", "FLOAT"),
             bigquery.SchemaField("generated_at", "TIMESTAMP"),
         ],
-        time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="trade_date"),
-        clustering_fields=["symbol"],
+        time_partitioning=TRADE_DATE_PARTITIONING,
+        clustering_fields=SYMBOL_CLUSTERING,
     )
 
 
+def run_in_bigquery(client: bigquery.Client, since: date) -> None:
+    # Same MACO logic as compute_maco_features/generate_signals, executed as one multi-statement
+    # script so prices never leave the warehouse. INSERT needs the three output tables to exist.
+    # As in main(), signals_maco holds the resume watermark, so it is written last.
+    sql = f"""
+    CREATE TEMP TABLE computed AS
+    {maco_sql(PRICES_1D(), SMA_FAST, SMA_SLOW)};
+
+    CREATE TEMP TABLE maco AS
+    SELECT computed.*
+    FROM computed
+    LEFT JOIN (
+      SELECT symbol, MAX(trade_date) AS watermark
+      FROM `{SIGNALS_MACO()}`
+      GROUP BY symbol
+    ) AS watermarks USING (symbol)
+    WHERE watermark IS NULL OR trade_date > watermark;
+
+    INSERT INTO `{MACO_FEATURES()}` (trade_date, symbol, sma_fast, sma_slow, ingest_ts)
+    SELECT trade_date, symbol, sma_fast, sma_slow, CURRENT_TIMESTAMP() FROM maco;
+
+    INSERT INTO `{PRED_NEXT_DAY()}` (trade_date, symbol, predicted_signal, predicted_direction, predicted_close, generated_at)
+    SELECT trade_date, symbol, signal, IF(sma_fast >= sma_slow, 'UP', 'DOWN'), close, CURRENT_TIMESTAMP()
+    FROM maco
+    WHERE TRUE
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY trade_date DESC) = 1;
+
+    INSERT INTO `{SIGNALS_MACO()}` (trade_date, symbol, signal, crossover, ingest_ts)
+    SELECT trade_date, symbol, signal, crossover, CURRENT_TIMESTAMP() FROM maco;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("since", "DATE", since)]
+    )
+    run_query(client, sql, job_config=job_config)
+
+
 def main() -> None:
     client = get_bq_client(settings.bq_location)
-    prices = fetch_prices(client)
+    earliest = date.today() - timedelta(days=HISTORY_DAYS)
+    watermarks = fetch_watermarks(client)
+    # Each symbol resumes from its own watermark; one without any (newly added, or no signals table
+    # yet) needs the full history, so the read window starts at the furthest-behind symbol.
+    if not watermarks or None in watermarks.values():
+        since = earliest
+    else:
+        since = max(min(watermarks.values()) - timedelta(days=WARMUP_DAYS), earliest)
+    if settings.maco_compute_engine == "bigquery":
+        run_in_bigquery(client, since)
+        return
+    prices = fetch_prices(client, since)
     if prices.empty:
         return
-    features = compute_maco_features(prices)
+    # Few distinct tickers across many rows: integer codes make the sort and grouping cheap.
+    prices["symbol"] = prices["symbol"].astype("category")
+    features = compute_maco_features(prices, SMA_FAST, SMA_SLOW)
     signals = generate_signals(features)
-    write_features(client, signals)
-    write_signals(client, signals)
-    write_next_day_prediction(client, signals)
+    # Plain strings again at the BigQuery boundary rather than relying on dictionary-encoded columns.
+    signals["symbol"] = signals["symbol"].astype("string")
+    # Rows up to a symbol's own watermark are already written; the older ones here only warm up the SMAs.
+    cutoff = pd.to_datetime(signals["symbol"].map(watermarks).astype(object))
+    new_rows = cutoff.isna().to_numpy() | (pd.to_datetime(signals["trade_date"]) > cutoff).to_numpy()
+    signals = signals[new_rows].reset_index(drop=True)
+    if signals.empty:
+        return
+
+    # Encode the shared columns to Arrow once; features and signals are column slices of it.
+    outputs = signals[["trade_date", "symbol", "sma_fast", "sma_slow", "signal", "crossover"]]
+    # An explicit tz-aware dtype keeps the column on Arrow's native timestamp path whatever the pandas version.
+    ingest_ts = pd.Series(pd.Timestamp.utcnow(), index=outputs.index, dtype="datetime64[ns, UTC]")
+    table = pa.Table.from_pandas(outputs.assign(ingest_ts=ingest_ts), preserve_index=False)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(write_features, client, table),
+            executor.submit(write_next_day_prediction, client, signals),
+        ]
+        for future in futures:
+            future.result()
+    # signals_maco is the resume watermark: load it only once features and predictions are in, so a
+    # failed load above is recomputed on the next run instead of being skipped for good.
+    write_signals(client, table)
 
 
 if __name__ == "__main__":
@@ -1,37 +1,115 @@
 from __future__ import annotations
 
+import numpy as np
 import pandas as pd
 
+try:
+    import numexpr as ne
+except ImportError:  # optional: only speeds up the crossover masks on large frames
+    ne = None
 
-def compute_sma(df: pd.DataFrame, window: int, value_col: str = "close", output_col: str | None = None) -> pd.Series:
-    out_col = output_col or f"sma_{window}"
-    return df[value_col].rolling(window=window, min_periods=1).mean().rename(out_col)
+
+# Indexed by the int8 crossover code: 0 = no cross, 1 = golden cross, 2 = dead cross.
+SIGNAL_LABELS = np.array(["HOLD", "BUY", "SELL"], dtype=object)
+CROSSOVER_LABELS = np.array(["NONE", "GOLDEN", "DEAD"], dtype=object)
+# Below this many rows numexpr's thread start-up costs more than the temporaries it saves.
+NUMEXPR_MIN_ROWS = 100_000
+
+
+def _group_starts(symbols: pd.Series) -> np.ndarray:
+    # symbols must be sorted so each one is a contiguous run; True marks each run's first row.
+    if isinstance(symbols.dtype, pd.CategoricalDtype):
+        keys = symbols.cat.codes.to_numpy()
+    else:
+        keys = symbols.to_numpy()
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return first
+
+
+def _shift_within_groups(values: np.ndarray, first: np.ndarray) -> np.ndarray:
+    shifted = np.empty(len(values), dtype="float64")
+    shifted[1:] = values[:-1]
+    shifted[first] = np.nan
+    return shifted
 
 
 def compute_maco_features(df: pd.DataFrame, sma_fast: int = 10, sma_slow: int = 20) -> pd.DataFrame:
+    # Returns rows sorted by (symbol, trade_date) on a fresh RangeIndex; generate_signals relies on it.
     df = df.sort_values(["symbol", "trade_date"]).reset_index(drop=True)
-    df["sma_fast"] = df.groupby("symbol", group_keys=False).apply(lambda g: compute_sma(g, sma_fast))
-    df["sma_slow"] = df.groupby("symbol", group_keys=False).apply(lambda g: compute_sma(g, sma_slow))
+    # Grouped rolling rather than differences of one running sum: pandas returns a flat window's value
+    # exactly, so equal SMAs stay equal and never register as a crossover.
+    close = df.groupby("symbol", observed=True, sort=False)["close"]
+    df["sma_fast"] = close.rolling(sma_fast, min_periods=1).mean().reset_index(level=0, drop=True)
+    df["sma_slow"] = close.rolling(sma_slow, min_periods=1).mean().reset_index(level=0, drop=True)
     return df
 
 
 def generate_signals(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.sort_values(["symbol", "trade_date"]).reset_index(drop=True)
-    df["prev_fast"] = df.groupby("symbol")["sma_fast"].shift(1)
-    df["prev_slow"] = df.groupby("symbol")["sma_slow"].shift(1)
-
-    def classify(row) -> tuple[str, str]:
-        if pd.isna(row["prev_fast"]) or pd.isna(row["prev_slow"]):
-            return "HOLD", "NONE"
-        crossed_up = row["prev_fast"] <= row["prev_slow"] and row["sma_fast"] > row["sma_slow"]
-        crossed_down = row["prev_fast"] >= row["prev_slow"] and row["sma_fast"] < row["sma_slow"]
-        if crossed_up:
-            return "BUY", "GOLDEN"
-        if crossed_down:
-            return "SELL", "DEAD"
-        return "HOLD", "NONE"
-
-    sigs = df.apply(lambda r: classify(r), axis=1, result_type="expand")
-    df["signal"] = sigs[0]
-    df["crossover"] = sigs[1]
-    return df.drop(columns=["prev_fast", "prev_slow"])
+    # Expects the (symbol, trade_date) ordering produced by compute_maco_features.
+    sma_fast = df["sma_fast"].to_numpy(dtype="float64")
+    sma_slow = df["sma_slow"].to_numpy(dtype="float64")
+    # Plain shift, then blank each symbol's first bar so it never sees the previous symbol's SMAs.
+    first = _group_starts(df["symbol"])
+    prev_fast = _shift_within_groups(sma_fast, first)
+    prev_slow = _shift_within_groups(sma_slow, first)
+
+    # NaN compares False, so rows without a previous bar (or without SMAs) fall through to HOLD/NONE.
+    if ne is not None and len(df) >= NUMEXPR_MIN_ROWS:
+        arrays = {"pf": prev_fast, "ps": prev_slow, "sf": sma_fast, "ss": sma_slow}
+        crossed_up = ne.evaluate("(pf <= ps) & (sf > ss)", local_dict=arrays)
+        crossed_down = ne.evaluate("(pf >= ps) & (sf < ss)", local_dict=arrays)
+    else:
+        crossed_up = (prev_fast <= prev_slow) & (sma_fast > sma_slow)
+        crossed_down = (prev_fast >= prev_slow) & (sma_fast < sma_slow)
+    codes = np.zeros(len(df), dtype=np.int8)
+    codes[crossed_up] = 1
+    codes[crossed_down] = 2
+    return df.assign(signal=np.take(SIGNAL_LABELS, codes), crossover=np.take(CROSSOVER_LABELS, codes))
+
+
+def maco_sql(prices_table: str, sma_fast: int = 10, sma_slow: int = 20) -> str:
+    # The compute_maco_features/generate_signals logic as one query over prices_table (rows with
+    # trade_date >= @since). A constant window returns its close exactly, as pandas' rolling mean does,
+    # so equal SMAs on a flat stretch never register as a crossover. Plain CASE rather than IF keeps
+    # the query runnable on SQLite for the tests.
+    return f"""
+    WITH sma AS (
+      SELECT
+        trade_date,
+        symbol,
+        close,
+        CASE WHEN MIN(close) OVER fast = MAX(close) OVER fast THEN close ELSE AVG(close) OVER fast END AS sma_fast,
+        CASE WHEN MIN(close) OVER slow = MAX(close) OVER slow THEN close ELSE AVG(close) OVER slow END AS sma_slow
+      FROM `{prices_table}`
+      WHERE trade_date >= @since
+      WINDOW
+        fast AS (PARTITION BY symbol ORDER BY trade_date ROWS BETWEEN {sma_fast - 1} PRECEDING AND CURRENT ROW),
+        slow AS (PARTITION BY symbol ORDER BY trade_date ROWS BETWEEN {sma_slow - 1} PRECEDING AND CURRENT ROW)
+    ),
+    lagged AS (
+      SELECT
+        *,
+        LAG(sma_fast) OVER bars AS prev_fast,
+        LAG(sma_slow) OVER bars AS prev_slow
+      FROM sma
+      WINDOW bars AS (PARTITION BY symbol ORDER BY trade_date)
+    )
+    SELECT
+      trade_date,
+      symbol,
+      close,
+      sma_fast,
+      sma_slow,
+      CASE
+        WHEN prev_fast <= prev_slow AND sma_fast > sma_slow THEN 'BUY'
+        WHEN prev_fast >= prev_slow AND sma_fast < sma_slow THEN 'SELL'
+        ELSE 'HOLD'
+      END AS signal,
+      CASE
+        WHEN prev_fast <= prev_slow AND sma_fast > sma_slow THEN 'GOLDEN'
+        WHEN prev_fast >= prev_slow AND sma_fast < sma_slow THEN 'DEAD'
+        ELSE 'NONE'
+      END AS crossover
+    FROM lagged
+    """
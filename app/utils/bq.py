@@ -1,16 +1,72 @@
 from __future__ import annotations
 
-from typing import Optional
+import io
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Optional
 
+import numpy as np
 import pandas as pd
-from google.cloud import bigquery
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery, bigquery_storage
 
 
+@lru_cache(maxsize=4)
 def get_bq_client(location: Optional[str] = None) -> bigquery.Client:
     return bigquery.Client(location=location)
 
 
-def load_dataframe(
+@lru_cache(maxsize=1)
+def get_bqstorage_client() -> bigquery_storage.BigQueryReadClient:
+    return bigquery_storage.BigQueryReadClient()
+
+
+LOAD_CHUNK_ROWS = 100_000
+
+
+def _run_chunked(
+    total_rows: int,
+    chunk_rows: Optional[int],
+    write_disposition: str,
+    submit: Callable[[int, int, str], bigquery.LoadJob],
+) -> bigquery.LoadJob:
+    if not chunk_rows or total_rows <= chunk_rows:
+        return submit(0, total_rows, write_disposition).result()
+    # The first chunk creates (or truncates) the table, so it has to land before the appends run.
+    result = submit(0, chunk_rows, write_disposition).result()
+    jobs = [
+        submit(start, min(start + chunk_rows, total_rows), bigquery.WriteDisposition.WRITE_APPEND)
+        for start in range(chunk_rows, total_rows, chunk_rows)
+    ]
+    for job in jobs:
+        result = job.result()
+    return result
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def dataframe_to_json_rows(df: pd.DataFrame, schema: Optional[list[bigquery.SchemaField]] = None) -> list[dict]:
+    int_cols = [f.name for f in schema or [] if f.field_type in ("INTEGER", "INT64") and f.name in df.columns]
+    if int_cols:
+        df = df.astype({col: "Int64" for col in int_cols})
+    return [
+        {col: _json_value(value) for col, value in row.items()}
+        for row in df.to_dict(orient="records")
+    ]
+
+
+def load_dataframe_as_json(
     client: bigquery.Client,
     df: pd.DataFrame,
     full_table_id: str,
@@ -18,16 +74,56 @@ def load_dataframe(
     schema: Optional[list[bigquery.SchemaField]] = None,
     time_partitioning: Optional[bigquery.TimePartitioning] = None,
     clustering_fields: Optional[list[str]] = None,
+    chunk_rows: Optional[int] = LOAD_CHUNK_ROWS,
 ) -> bigquery.LoadJob:
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=write_disposition,
-        autodetect=(schema is None),
-        schema=schema,
-        time_partitioning=time_partitioning,
-        clustering_fields=clustering_fields,
-    )
-    load_job = client.load_table_from_dataframe(df, full_table_id, job_config=job_config)
-    return load_job.result()
+    # Newline-delimited JSON skips the pandas -> parquet encode that load_table_from_dataframe does.
+    rows = dataframe_to_json_rows(df, schema)
+
+    def submit(start: int, stop: int, disposition: str) -> bigquery.LoadJob:
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            write_disposition=disposition,
+            autodetect=(schema is None),
+            schema=schema,
+            time_partitioning=time_partitioning,
+            clustering_fields=clustering_fields,
+        )
+        return client.load_table_from_json(rows[start:stop], full_table_id, job_config=job_config)
+
+    return _run_chunked(len(rows), chunk_rows, write_disposition, submit)
+
+
+def load_arrow_table(
+    client: bigquery.Client,
+    table: pa.Table,
+    full_table_id: str,
+    write_disposition: str = bigquery.WriteDisposition.WRITE_APPEND,
+    schema: Optional[list[bigquery.SchemaField]] = None,
+    time_partitioning: Optional[bigquery.TimePartitioning] = None,
+    clustering_fields: Optional[list[str]] = None,
+    chunk_rows: Optional[int] = LOAD_CHUNK_ROWS,
+) -> bigquery.LoadJob:
+    def submit(start: int, stop: int, disposition: str) -> bigquery.LoadJob:
+        buffer = io.BytesIO()
+        # BigQuery TIMESTAMP is microsecond precision; pandas hands over nanoseconds.
+        pq.write_table(
+            table.slice(start, stop - start),
+            buffer,
+            compression="snappy",
+            coerce_timestamps="us",
+            allow_truncated_timestamps=True,
+        )
+        buffer.seek(0)
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=disposition,
+            schema=schema,
+            time_partitioning=time_partitioning,
+            clustering_fields=clustering_fields,
+        )
+        return client.load_table_from_file(buffer, full_table_id, job_config=job_config)
+
+    return _run_chunked(table.num_rows, chunk_rows, write_disposition, submit)
 
 
 def run_query(client: bigquery.Client, sql: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> bigquery.QueryJob:
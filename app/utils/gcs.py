@@ -1,16 +1,22 @@
 from __future__ import annotations
 
-import io
 from datetime import date
+from functools import lru_cache
 from typing import Optional
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from google.cloud import storage
 
 
+@lru_cache(maxsize=1)
+def get_storage_client() -> storage.Client:
+    return storage.Client()
+
+
 def get_bucket(bucket_name: str) -> storage.bucket.Bucket:
-    client = storage.Client()
-    return client.bucket(bucket_name)
+    return get_storage_client().bucket(bucket_name)
 
 
 def build_partition_path(base_prefix: str, symbol: str, partition_date: date, filename: str) -> str:
@@ -22,14 +28,19 @@ def upload_dataframe_as_parquet(
     df: pd.DataFrame,
     object_name: str,
     compression: str = "snappy",
+    row_group_size: int = 64_000,
 ) -> str:
     bucket = get_bucket(bucket_name)
     blob = bucket.blob(object_name)
 
-    parquet_buffer = io.BytesIO()
-    df.to_parquet(parquet_buffer, engine="pyarrow", compression=compression, index=False)
-    parquet_buffer.seek(0)
-    blob.upload_from_file(parquet_buffer, content_type="application/octet-stream")
+    # Stream row groups into a resumable upload rather than materialising the whole file first.
+    with blob.open("wb", content_type="application/octet-stream", ignore_flush=True) as f:
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            f,
+            compression=compression,
+            row_group_size=row_group_size,
+        )
     return f"gs://{bucket_name}/{object_name}"
 
 
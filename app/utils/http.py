@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.config import settings
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
+)
+POOL_SIZE = max(32, len(settings.symbols))
+
+class _BackoffFirstRetry(Retry):
+    def get_backoff_time(self) -> float:
+        # urllib3 2.x retries immediately after the first failure; wait one backoff step there too.
+        if len(self.history) == 1 and self.history[0].redirect_location is None:
+            return min(self.backoff_max, self.backoff_factor + random.random() * self.backoff_jitter)
+        return super().get_backoff_time()
+
+
+# Yahoo throttles bursts with 429s: unless it sends a Retry-After hint, 5 retries back off
+# 10s, 20s, 40s, 80s, 120s (capped at 2 minutes), each plus up to 10s of jitter so the
+# worker threads don't come back in lockstep.
+YAHOO_RETRY = _BackoffFirstRetry(
+    total=5,
+    backoff_factor=10,
+    backoff_jitter=10,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("GET",),
+    respect_retry_after_header=True,
+)
+
+# Process-wide session so Finnhub and Yahoo calls reuse keep-alive connections per host.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT})
+SESSION.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0))
+SESSION.mount(
+    "https://query1.finance.yahoo.com",
+    HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=YAHOO_RETRY),
+)
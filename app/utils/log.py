@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import threading
+
+
+_PRINT_LOCK = threading.Lock()
+
+
+def log(message: str) -> None:
+    # Jobs fan out work across threads; keep each message on its own line.
+    with _PRINT_LOCK:
+        print(message, flush=True)
@@ -1,13 +1,66 @@
 from __future__ import annotations
 
+import pyarrow as pa
+from google.cloud import bigquery
+
 from app.config import settings
 
 
+# Settings are fixed for the life of the process, so table ids are formatted once at import.
+_PROJECT = settings.gcp_project_id
+
+
 def fq(dataset: str, table: str) -> str:
-    return f"{settings.gcp_project_id}.{dataset}.{table}"
+    return f"{_PROJECT}.{dataset}.{table}"
+
+
+PRICES_1D_TABLE = fq(settings.dataset_prices_1d, "prices_1d")
+MACO_FEATURES_TABLE = fq(settings.dataset_maco_features, "maco_features")
+SIGNALS_MACO_TABLE = fq(settings.dataset_signals_maco, "signals_maco")
+PRED_NEXT_DAY_TABLE = fq(settings.dataset_pred_next_day, "pred_next_day")
+
+
+def PRICES_1D() -> str:
+    return PRICES_1D_TABLE
+
+
+def MACO_FEATURES() -> str:
+    return MACO_FEATURES_TABLE
+
+
+def SIGNALS_MACO() -> str:
+    return SIGNALS_MACO_TABLE
+
+
+def PRED_NEXT_DAY() -> str:
+    return PRED_NEXT_DAY_TABLE
 
 
-PRICES_1D = lambda: fq(settings.dataset_prices_1d, "prices_1d")
-MACO_FEATURES = lambda: fq(settings.dataset_maco_features, "maco_features")
-SIGNALS_MACO = lambda: fq(settings.dataset_signals_maco, "signals_maco")
-PRED_NEXT_DAY = lambda: fq(settings.dataset_pred_next_day, "pred_next_day")
+PRICES_1D_SCHEMA = [
+    bigquery.SchemaField("trade_date", "DATE"),
+    bigquery.SchemaField("open", "FLOAT"),
+    bigquery.SchemaField("high", "FLOAT"),
+    bigquery.SchemaField("low", "FLOAT"),
+    bigquery.SchemaField("close", "FLOAT"),
+    bigquery.SchemaField("adj_close", "FLOAT"),
+    bigquery.SchemaField("volume", "INT64"),
+    bigquery.SchemaField("symbol", "STRING"),
+    bigquery.SchemaField("provider", "STRING"),
+    bigquery.SchemaField("ingest_ts", "TIMESTAMP"),
+]
+PRICES_1D_ARROW_SCHEMA = pa.schema(
+    [
+        ("trade_date", pa.date32()),
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("adj_close", pa.float64()),
+        ("volume", pa.int64()),
+        ("symbol", pa.string()),
+        ("provider", pa.string()),
+        ("ingest_ts", pa.timestamp("us", tz="UTC")),
+    ]
+)
+TRADE_DATE_PARTITIONING = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="trade_date")
+SYMBOL_CLUSTERING = ["symbol"]
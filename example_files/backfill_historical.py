@@ -2,7 +2,10 @@
 # Normalizes to columns: time, o, h, l, c, v
 
 import os, io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yfinance as yf
 from google.cloud import storage
 from pipeline.config import SYMBOLS  # <- your tickers list
@@ -12,7 +15,10 @@ DATA_PREFIX = os.getenv("DATA_PREFIX", "data/raw")
 if not BUCKET:
     raise RuntimeError("GCS_BUCKET env var is required")
 
+MAX_WORKERS = 16
+
 _storage = storage.Client()
+_bucket = _storage.bucket(BUCKET)  # shared by the worker threads; uploads are thread-safe
 
 def _flatten_cols(cols):
     """Make sure columns are simple strings (handles MultiIndex tuples)."""
@@ -25,11 +31,25 @@ def _flatten_cols(cols):
             flat.append(str(c))
     return flat
 
-def fetch_yahoo_2y(symbol: str) -> pd.DataFrame:
-    # 1) Download daily candles for ~2 years
-    raw = yf.download(symbol, period="2y", interval="1d",
-                      auto_adjust=False, actions=False, progress=False)
+def download_all(symbols) -> pd.DataFrame:
+    # 1) Download daily candles for ~2 years for every symbol in one batched call
+    raw = yf.download(list(symbols), period="2y", interval="1d", group_by="ticker",
+                      auto_adjust=False, actions=False, progress=False, threads=True)
     if raw is None or raw.empty:
+        raise RuntimeError(f"Yahoo returned no data for {list(symbols)}")
+    return raw
+
+def fetch_yahoo_2y(symbol: str, raw: pd.DataFrame) -> pd.DataFrame:
+    # Slice this symbol out of the batched download; failed tickers come back as all-NaN columns.
+    # A one-ticker download has flat columns, so there is nothing to slice.
+    if isinstance(raw.columns, pd.MultiIndex):
+        if symbol not in raw.columns.get_level_values(0):
+            raise RuntimeError(f"Yahoo returned no data for {symbol}")
+        raw = raw[symbol]
+    elif len(SYMBOLS) != 1:
+        raise RuntimeError(f"Yahoo returned no data for {symbol}")
+    raw = raw.dropna(how="all")
+    if raw.empty:
         raise RuntimeError(f"Yahoo returned no data for {symbol}")
 
     df = raw.reset_index()
@@ -63,19 +83,24 @@ def fetch_yahoo_2y(symbol: str) -> pd.DataFrame:
                .sort_values("time"))
     return out
 
-def _write_csv_to_gcs(df: pd.DataFrame, path: str) -> None:
-    bucket = _storage.bucket(BUCKET)
-    blob = bucket.blob(path)
-    b = df.to_csv(index=False).encode("utf-8")
-    blob.upload_from_file(io.BytesIO(b), content_type="text/csv")
+def _write_parquet_to_gcs(df: pd.DataFrame, path: str) -> None:
+    blob = _bucket.blob(path)
+    buf = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buf, compression="snappy")
+    buf.seek(0)
+    blob.upload_from_file(buf, content_type="application/octet-stream")
 
-def backfill_symbol(symbol: str) -> str:
-    df = fetch_yahoo_2y(symbol)
-    dest = f"{DATA_PREFIX}/{symbol}.csv"
-    _write_csv_to_gcs(df, dest)
+def backfill_symbol(symbol: str, raw: pd.DataFrame) -> str:
+    df = fetch_yahoo_2y(symbol, raw)
+    dest = f"{DATA_PREFIX}/{symbol}.parquet"
+    _write_parquet_to_gcs(df, dest)
     return dest
 
 if __name__ == "__main__":
-    for s in SYMBOLS:
-        out = backfill_symbol(s)
-        print(f"Wrote: gs://{BUCKET}/{out}")
+    raw = download_all(SYMBOLS)
+    # The download is already batched; uploads are network-bound, so run those side by side.
+    with ThreadPoolExecutor(max_workers=min(len(SYMBOLS), MAX_WORKERS)) as ex:
+        futures = [ex.submit(backfill_symbol, s, raw) for s in SYMBOLS]
+        for fut in as_completed(futures):
+            out = fut.result()
+            print(f"Wrote: gs://{BUCKET}/{out}")
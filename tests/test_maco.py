@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.transforms.maco import compute_maco_features, generate_signals, maco_sql
+
+
+def _prices(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2024-01-01", periods=120).date
+    frames = []
+    for symbol in ("AAPL", "TSLA", "BTC-USD"):
+        close = 100 + rng.normal(0, 1, len(days)).cumsum()
+        if symbol == "TSLA":
+            # Halted / flat stretch: both SMAs converge on the same value and must compare equal.
+            close[30:90] = close[30]
+        frames.append(pd.DataFrame({"trade_date": days, "symbol": symbol, "close": close}))
+    # Shuffled so compute_maco_features has to do the sorting itself.
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def _reference(df: pd.DataFrame) -> pd.DataFrame:
+    # The original grouped-rolling MACO, kept as the behaviour the vectorized path must reproduce.
+    df = df.sort_values(["symbol", "trade_date"]).reset_index(drop=True)
+    close = df.groupby("symbol", group_keys=False)["close"]
+    df["sma_fast"] = close.apply(lambda s: s.rolling(10, min_periods=1).mean())
+    df["sma_slow"] = close.apply(lambda s: s.rolling(20, min_periods=1).mean())
+    prev_fast = df.groupby("symbol")["sma_fast"].shift(1)
+    prev_slow = df.groupby("symbol")["sma_slow"].shift(1)
+    up = (prev_fast <= prev_slow) & (df["sma_fast"] > df["sma_slow"])
+    down = (prev_fast >= prev_slow) & (df["sma_fast"] < df["sma_slow"])
+    df["signal"] = np.select([up, down], ["BUY", "SELL"], "HOLD")
+    df["crossover"] = np.select([up, down], ["GOLDEN", "DEAD"], "NONE")
+    return df
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("categorical", [False, True])
+def test_signals_match_grouped_rolling(seed: int, categorical: bool) -> None:
+    prices = _prices(seed)
+    expected = _reference(prices)
+    if categorical:
+        prices["symbol"] = prices["symbol"].astype("category")
+
+    result = generate_signals(compute_maco_features(prices))
+
+    np.testing.assert_array_equal(result["sma_fast"].to_numpy(), expected["sma_fast"].to_numpy())
+    np.testing.assert_array_equal(result["sma_slow"].to_numpy(), expected["sma_slow"].to_numpy())
+    assert result["signal"].tolist() == expected["signal"].tolist()
+    assert result["crossover"].tolist() == expected["crossover"].tolist()
+
+
+def test_flat_stretch_has_no_crossover() -> None:
+    result = generate_signals(compute_maco_features(_prices(0)))
+    flat = result[result["symbol"] == "TSLA"].iloc[50:90]
+    assert (flat["sma_fast"] == flat["sma_slow"]).all()
+    assert (flat["signal"] == "HOLD").all()
+
+
+def test_sql_matches_pandas_on_flat_stretch() -> None:
+    # SQLite stands in for BigQuery: same window functions, and AVG sums naively like the warehouse.
+    prices = _prices(0)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE prices_1d (trade_date TEXT, symbol TEXT, close REAL)")
+    conn.executemany(
+        "INSERT INTO prices_1d VALUES (?, ?, ?)",
+        [(d.isoformat(), sym, float(c)) for d, sym, c in prices[["trade_date", "symbol", "close"]].itertuples(index=False)],
+    )
+    result = pd.read_sql_query(maco_sql("prices_1d"), conn, params={"since": "1900-01-01"})
+    result = result.sort_values(["symbol", "trade_date"]).reset_index(drop=True)
+    expected = generate_signals(compute_maco_features(prices))
+
+    np.testing.assert_allclose(result["sma_fast"].to_numpy(), expected["sma_fast"].to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(result["sma_slow"].to_numpy(), expected["sma_slow"].to_numpy(), rtol=1e-12)
+    assert result["signal"].tolist() == expected["signal"].tolist()
+    assert result["crossover"].tolist() == expected["crossover"].tolist()
+    flat = result[result["symbol"] == "TSLA"].iloc[50:90]
+    assert (flat["sma_fast"] == flat["sma_slow"]).all()
+
+
+def test_numexpr_masks_match_reference(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("numexpr")
+    monkeypatch.setattr("app.transforms.maco.NUMEXPR_MIN_ROWS", 0)
+    prices = _prices(0)
+    expected = _reference(prices)
+
+    result = generate_signals(compute_maco_features(prices))
+
+    assert result["signal"].tolist() == expected["signal"].tolist()
+    assert result["crossover"].tolist() == expected["crossover"].tolist()